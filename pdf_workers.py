@@ -0,0 +1,169 @@
+"""
+Worker-process functions for PDF extraction and chunking
+
+Kept apart from rag_finance_pdf.py so pool workers never import torch,
+chromadb or the HuggingFace model stack. On spawn platforms (macOS, Windows)
+every worker re-imports the module its target function lives in, and doing
+that for the full RAG script costs several seconds per worker.
+"""
+
+import os
+import hashlib
+from contextlib import suppress
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+import fitz  # PyMuPDF
+import pypdfium2 as pdfium
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+
+# Extracted text is cached here, keyed by a hash of the PDF bytes
+PDF_CACHE_DIR = Path(".pdf_text_cache")
+
+# Part of the text cache key; bump whenever read_pdf_text output changes
+PDF_TEXT_FORMAT_VERSION = 4
+
+# Chunks are measured in this model's tokens; rag_finance_pdf.py embeds with it too
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+CHUNK_SIZE = 220  # Leaves room for [CLS]/[SEP] within the 256-token limit
+CHUNK_OVERLAP = 40  # Overlap to preserve context across chunk boundaries
+
+
+def read_pdf_text(data: bytes, backend: str) -> str:
+    """
+    Extract the text of every page from in-memory PDF bytes
+
+    Args:
+        data: Raw PDF file contents
+        backend: "pdfium" (fast, text-only) or "fitz" (PyMuPDF)
+
+    Returns:
+        Concatenated page text
+    """
+    if backend == "pdfium":
+        pdf = pdfium.PdfDocument(data)
+        parts = []
+        for page in pdf:
+            textpage = page.get_textpage()
+            # PDFium breaks lines with \r\n and ends pages without a newline.
+            # A hyphen at a line break comes back as U+FFFE, usually in place of
+            # the break itself, so restore both the hyphen and the newline.
+            text = textpage.get_text_range().replace("\r\n", "\n")
+            parts.append(text.replace("\ufffe\n", "\ufffe").replace("\ufffe", "-\n"))
+            textpage.close()
+            page.close()
+        pdf.close()
+        # Newline between pages, as fitz ends every page with one
+        return "\n".join(parts)
+
+    doc = fitz.open(stream=data, filetype="pdf")
+
+    # Collect page text and join once; repeated += copies the whole string per page.
+    # Plain unsorted text skips layout sorting, which chunking doesn't need.
+    flags = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+    parts = [page.get_text("text", sort=False, flags=flags) for page in doc]
+
+    doc.close()
+    return "".join(parts)
+
+
+def extract_pdf(path: str, backend: str = "pdfium", data: Optional[bytes] = None) -> Tuple[Optional[Dict[str, str]], str]:
+    """
+    Extract the text of a single PDF (runs inside a worker process)
+
+    Status lines are returned rather than printed so the parent process can
+    print them one at a time instead of interleaving output from workers.
+
+    Args:
+        path: Path to the PDF file
+        backend: "pdfium" (fast, text-only) or "fitz" (PyMuPDF)
+        data: File contents if already read, otherwise read from path
+
+    Returns:
+        Tuple of (dictionary with 'source' and 'text' keys, or None if
+        empty/unreadable; status line to print)
+    """
+    name = os.path.basename(path)
+    try:
+        if data is None:
+            data = Path(path).read_bytes()
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        cache_file = PDF_CACHE_DIR / f"{digest}.{backend}.v{PDF_TEXT_FORMAT_VERSION}.txt"
+
+        if cache_file.exists():
+            text = cache_file.read_bytes().decode("utf-8")
+        else:
+            text = read_pdf_text(data, backend)
+
+            # Write via a temp file so concurrent workers never see a partial entry
+            tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            try:
+                PDF_CACHE_DIR.mkdir(exist_ok=True)
+                tmp_file.write_bytes(text.encode("utf-8"))
+                os.replace(tmp_file, cache_file)
+            except OSError:
+                # The cache is only a speed-up; a read-only or full disk must not drop the document
+                with suppress(OSError):
+                    tmp_file.unlink(missing_ok=True)
+
+        if text.strip():
+            return {
+                "source": path,
+                "text": text
+            }, f"  ✓ Loaded: {name} ({len(text)} chars)"
+        return None, f"  ⚠ Empty PDF: {name}"
+
+    except Exception as e:
+        return None, f"  ❌ Error loading {name}: {e}"
+
+
+def prefetch_pdf(path: str) -> Tuple[str, Optional[bytes]]:
+    """
+    Read a PDF's bytes (runs inside an I/O thread); failures are left for the extractor to report
+    """
+    try:
+        return path, Path(path).read_bytes()
+    except OSError:
+        return path, None
+
+
+def extract_prefetched(item: Tuple[str, Optional[bytes]], backend: str = "pdfium") -> Tuple[Optional[Dict[str, str]], str]:
+    """
+    Extract a PDF from a (path, data) pair produced by prefetch_pdf
+    """
+    path, data = item
+    return extract_pdf(path, backend, data)
+
+
+@lru_cache(maxsize=1)
+def _get_tokenizer():
+    """Load the embedding model's tokenizer once per process"""
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+
+
+@lru_cache(maxsize=65536)
+def token_len(text: str) -> int:
+    """
+    Length of a text in embedding-model tokens (memoized; the splitter re-measures the same pieces)
+    """
+    return len(_get_tokenizer().encode(text, add_special_tokens=False, verbose=False))
+
+
+# Shared by every chunking worker; built once per process at import time.
+# Sized in tokens so chunks fill, but never overflow, MiniLM's 256-token window.
+SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    length_function=token_len,
+    separators=["\n\n", "\n", ". ", " ", ""]  # Better split points
+)
+
+
+def split_doc(doc: Dict[str, str]) -> List[tuple]:
+    """
+    Split a single document into (chunk, source, chunk_id) tuples (runs inside a worker process)
+    """
+    return [(chunk, doc["source"], i) for i, chunk in enumerate(SPLITTER.split_text(doc["text"]))]
@@ -6,161 +6,742 @@ Reads PDF documents from a folder and creates a searchable knowledge base
 
 import os
 import sys
+import hashlib
+import sqlite3
+import threading
+import multiprocessing
+from contextlib import nullcontext
+from multiprocessing.pool import Pool
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, lru_cache
+from itertools import chain, islice
 from pathlib import Path
-from typing import List, Dict
-import fitz  # PyMuPDF
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
-from langchain_community.vectorstores import Chroma
+from typing import List, Dict, Optional, Callable, Tuple, Iterable, Iterator
+import numpy as np
+import torch
+from langchain.schema import Document, BaseRetriever
+from langchain.schema.embeddings import Embeddings
+from langchain.schema.vectorstore import VectorStore
+from langchain_community.vectorstores import Chroma, FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.llms import HuggingFacePipeline
 from langchain.chains import RetrievalQA
+from langchain.callbacks.manager import CallbackManagerForRetrieverRun
 from transformers import pipeline
+from pdf_workers import EMBEDDING_MODEL, CHUNK_SIZE, CHUNK_OVERLAP, extract_pdf, extract_prefetched, prefetch_pdf, split_doc
 
 
-def load_financial_pdfs(root_folder: str) -> List[Dict[str, str]]:
+# Exported ONNX models are cached here so the export only happens once
+_ONNX_MODEL_DIR = Path(".onnx_models")
+
+# Document embeddings are cached here across rebuilds, keyed by a hash of the chunk text
+_EMBEDDING_CACHE_PATH = Path("embeddings_cache.sqlite")
+
+# Row i holds the embedding of Chroma id "c{i}"; written next to chroma.sqlite3
+_EMBEDDING_MATRIX_FILE = "embeddings.npy"
+
+# Build state markers in the Chroma directory. chromadb creates chroma.sqlite3
+# as soon as the client opens, so the in-progress marker flags a partial build.
+# The completion marker records the chunking the database was built with.
+_BUILD_COMPLETE_FILE = ".build_complete"
+_BUILD_IN_PROGRESS_FILE = ".build_in_progress"
+_CHUNKING_SIGNATURE = f"{EMBEDDING_MODEL} tokens size={CHUNK_SIZE} overlap={CHUNK_OVERLAP}"
+
+# Up to this many chunks a brute-force matmul beats Chroma's HNSW graph search
+MATMUL_MAX_VECTORS = 50_000
+
+LLM_MODEL = "google/flan-t5-base"  # Using larger base model for better accuracy
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
     """
-    Load all PDF files from the specified folder
+    Yield successive lists of up to `size` items from an iterable
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def iter_documents(root_folder: str, workers: Optional[int] = None, backend: str = "pdfium", io_workers: int = 0, pool: Optional[Pool] = None) -> Iterator[Dict[str, str]]:
+    """
+    Lazily load PDF files from the specified folder, one document at a time
+    
+    Files are extracted in windows of a few per worker, and the next window
+    only starts once the consumer has taken the current one, so at most a
+    window's worth of text is held in memory.
     
     Args:
         root_folder: Path to folder containing PDF files
+        workers: Number of extraction processes (defaults to the CPU count)
+        backend: PDF text backend, "pdfium" or "fitz"
+        io_workers: Threads prefetching file bytes; useful on network storage (0 = off)
+        pool: Process pool to run on instead of starting one (see iter_pdf_chunks)
         
-    Returns:
-        List of dictionaries with 'source' and 'text' keys
+    Yields:
+        Dictionaries with 'source' and 'text' keys
     """
-    documents = []
+    if backend not in ("pdfium", "fitz"):
+        raise ValueError(f"Unknown PDF backend: {backend}")
+    
     pdf_folder = Path(root_folder)
     
     if not pdf_folder.exists():
         print(f"❌ Folder not found: {root_folder}")
-        return documents
+        return
     
     pdf_files = list(pdf_folder.glob("*.pdf"))
     
     if not pdf_files:
         print(f"❌ No PDF files found in: {root_folder}")
-        return documents
+        return
     
     print(f"📄 Found {len(pdf_files)} PDF files in {root_folder}")
     
-    for pdf_path in pdf_files:
-        try:
-            doc = fitz.open(str(pdf_path))
-            text = ""
-            
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                text += page.get_text()
-            
-            doc.close()
-            
-            if text.strip():
-                documents.append({
-                    "source": str(pdf_path),
-                    "text": text
-                })
-                print(f"  ✓ Loaded: {pdf_path.name} ({len(text)} chars)")
+    # Extraction is CPU-bound, so spread the files across processes
+    processes = min(workers or os.cpu_count() or 1, len(pdf_files))
+    paths = [str(p) for p in pdf_files]
+    loaded = 0
+    # The I/O pool starts no threads unless io_workers is set and it gets used
+    with (nullcontext(pool) if pool else multiprocessing.Pool(processes=processes)) as pool, \
+            ThreadPoolExecutor(max_workers=max(io_workers, 1)) as io_pool:
+        for window in _batched(paths, processes * 2):
+            if io_workers:
+                # Threads only overlap the (latency-bound) file reads; neither PDF
+                # library is thread-safe, so parsing stays in the process pool
+                extract = partial(extract_prefetched, backend=backend)
+                results = pool.imap_unordered(extract, io_pool.map(prefetch_pdf, window))
             else:
-                print(f"  ⚠ Empty PDF: {pdf_path.name}")
-                
-        except Exception as e:
-            print(f"  ❌ Error loading {pdf_path.name}: {e}")
+                extract = partial(extract_pdf, backend=backend)
+                results = pool.imap_unordered(extract, window)
+            
+            for res, status in results:
+                print(status)
+                if res:
+                    loaded += 1
+                    yield res
+    
+    print(f"\n✅ Successfully loaded {loaded} PDF documents\n")
+
+
+def load_financial_pdfs(root_folder: str, workers: Optional[int] = None, backend: str = "pdfium", io_workers: int = 0) -> List[Dict[str, str]]:
+    """
+    Load all PDF files from the specified folder
     
-    print(f"\n✅ Successfully loaded {len(documents)} PDF documents\n")
-    return documents
+    Args:
+        root_folder: Path to folder containing PDF files
+        workers: Number of extraction processes (defaults to the CPU count)
+        backend: PDF text backend, "pdfium" or "fitz"
+        io_workers: Threads prefetching file bytes; useful on network storage (0 = off)
+        
+    Returns:
+        List of dictionaries with 'source' and 'text' keys
+    """
+    return list(iter_documents(root_folder, workers, backend, io_workers))
+
+
+def iter_chunks(documents: Iterable[Dict[str, str]], workers: Optional[int] = None, pool: Optional[Pool] = None) -> Iterator[Document]:
+    """
+    Lazily split documents into chunks for embedding
+    
+    Each window of documents is split in parallel and released before the
+    next one is pulled from `documents`.
+    
+    Args:
+        documents: Iterable of document dictionaries
+        workers: Number of splitting processes (defaults to the CPU count)
+        pool: Process pool to run on instead of starting one (see iter_pdf_chunks)
+        
+    Yields:
+        LangChain Document objects
+    """
+    # Splitting is pure-Python string work, so spread documents across processes
+    processes = workers or os.cpu_count() or 1
+    created = 0
+    with (nullcontext(pool) if pool else multiprocessing.Pool(processes=processes)) as pool:
+        for n, window in enumerate(_batched(documents, processes)):
+            if n == 0:
+                # Announced once documents arrive, after the loader's own messages
+                print("🔪 Chunking documents...")
+            for splits in pool.imap(split_doc, window):
+                for chunk, source, i in splits:
+                    created += 1
+                    yield Document(
+                        page_content=chunk,
+                        metadata={
+                            "source": source,
+                            "chunk_id": i
+                        }
+                    )
+    
+    print(f"✅ Created {created} text chunks\n")
 
 
-def chunk_documents(documents: List[Dict[str, str]]) -> List[Document]:
+def iter_pdf_chunks(root_folder: str, workers: Optional[int] = None, backend: str = "pdfium", io_workers: int = 0) -> Iterator[Document]:
+    """
+    Lazily load and chunk every PDF in a folder on a single process pool
+    
+    Extraction and splitting share the pool, so the pipeline never runs more
+    than `workers` processes, and the pool is forked before any I/O threads start.
+    
+    Args:
+        root_folder: Path to folder containing PDF files
+        workers: Number of worker processes (defaults to the CPU count)
+        backend: PDF text backend, "pdfium" or "fitz"
+        io_workers: Threads prefetching file bytes; useful on network storage (0 = off)
+        
+    Yields:
+        LangChain Document objects
+    """
+    with multiprocessing.Pool(processes=workers or os.cpu_count() or 1) as pool:
+        documents = iter_documents(root_folder, workers, backend, io_workers, pool=pool)
+        yield from iter_chunks(documents, workers, pool=pool)
+
+
+def chunk_documents(documents: List[Dict[str, str]], workers: Optional[int] = None) -> List[Document]:
     """
     Split documents into chunks for embedding
     
     Args:
         documents: List of document dictionaries
+        workers: Number of splitting processes (defaults to the CPU count)
         
     Returns:
         List of LangChain Document objects
     """
-    print("🔪 Chunking documents...")
+    return list(iter_chunks(documents, workers))
+
+
+class ONNXEmbeddings(Embeddings):
+    """
+    Sentence-transformer embeddings served by ONNX Runtime (CPU)
+    
+    Mirrors the sentence-transformers pipeline: mean pooling over the
+    attention mask followed by L2 normalization.
+    """
     
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1500,  # Larger chunks for better context
-        chunk_overlap=300,  # More overlap to preserve context
-        length_function=len,
-        separators=["\n\n", "\n", ". ", " ", ""]  # Better split points
+    def __init__(self, model_name: str = EMBEDDING_MODEL, batch_size: int = 128, max_length: int = 256):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+        
+        model_dir = _ONNX_MODEL_DIR / model_name.split("/")[-1]
+        if model_dir.exists():
+            self.model = ORTModelForFeatureExtraction.from_pretrained(model_dir)
+            self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        else:
+            print(f"  ℹ️  Exporting {model_name} to ONNX (first run only)...")
+            self.model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+            self.model.save_pretrained(model_dir)
+            self.tokenizer.save_pretrained(model_dir)
+        
+        self.batch_size = batch_size
+        self.max_length = max_length
+    
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np"
+        )
+        hidden = self.model(**inputs).last_hidden_state
+        
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Batch texts of similar length together so dynamic padding stays small
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.empty((len(texts), self.model.config.hidden_size), dtype=np.float32)
+        
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            vectors[idx] = self._embed_batch([texts[i] for i in idx])
+        
+        return vectors.tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+def load_embeddings() -> Embeddings:
+    """
+    Load the embedding model on the fastest available runtime
+    
+    Uses sentence-transformers in FP16 on CUDA, and ONNX Runtime on CPU.
+    
+    Returns:
+        LangChain Embeddings instance
+    """
+    if not torch.cuda.is_available():
+        torch.set_num_threads(os.cpu_count() or 1)
+        return ONNXEmbeddings(EMBEDDING_MODEL)
+    
+    embeddings = HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs={'device': 'cuda'},
+        encode_kwargs={
+            'normalize_embeddings': True,
+            'batch_size': 128,  # Large batches keep the GPU busy
+            'convert_to_numpy': True
+        }
     )
     
-    chunks = []
-    for doc in documents:
-        splits = text_splitter.split_text(doc["text"])
-        for i, chunk in enumerate(splits):
-            chunks.append(
-                Document(
-                    page_content=chunk,
-                    metadata={
-                        "source": doc["source"],
-                        "chunk_id": i
-                    }
-                )
+    # FP16 roughly doubles GPU throughput; cosine drift is negligible
+    embeddings.client.half()
+    
+    return embeddings
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that loads the real model on first use and caches query vectors
+    
+    Loading an existing store never embeds documents, so the model is only
+    needed once the first query arrives. Repeated questions in a session
+    reuse the cached query embedding.
+    """
+    
+    def __init__(self, factory: Callable[[], Embeddings], query_cache_size: int = 1024):
+        self._factory = factory
+        self._model: Optional[Embeddings] = None
+        # Queries are embedded on a background thread; load the model only once
+        self._lock = threading.Lock()
+        # Tuples rather than lists so cached vectors cannot be mutated by callers
+        self._cached_query = lru_cache(maxsize=query_cache_size)(self._embed_query)
+    
+    @property
+    def model(self) -> Embeddings:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._factory()
+        return self._model
+    
+    def _embed_query(self, text: str) -> tuple:
+        return tuple(self.model.embed_query(text))
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        return list(self._cached_query(text))
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that persists document vectors in SQLite
+    
+    Vectors are keyed by a hash of the model name and chunk text, so a
+    rebuild only embeds chunks that were not seen before. Each distinct
+    text is embedded once per call, so repeated headers, footers and
+    disclaimers cost a single model pass.
+    """
+    
+    def __init__(self, embeddings: Embeddings, path: Path = _EMBEDDING_CACHE_PATH, namespace: str = EMBEDDING_MODEL):
+        self.embeddings = embeddings
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(str(path))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+    
+    def _key(self, text: str) -> str:
+        data = f"{self.namespace}\0{text}".encode("utf-8")
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = {}
+        
+        # Stay below SQLite's bound-parameter limit
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), 900):
+            batch = unique_keys[start:start + 900]
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                batch
             )
+            found.update(rows)
+        
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_rows = [
+                (key, np.asarray(vector, dtype=np.float32).tobytes())
+                for key, vector in zip(missing, vectors)
+            ]
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)", new_rows)
+            self._conn.commit()
+            found.update(new_rows)
+        
+        self.misses += len(missing)
+        self.hits += len(unique_keys) - len(missing)
+        return [np.frombuffer(found[key], dtype=np.float32).tolist() for key in keys]
     
-    print(f"✅ Created {len(chunks)} text chunks\n")
-    return chunks
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
 
+def _chunk_ids(docs: List[Document]) -> tuple:
+    """Identify a set of retrieved chunks by (source, chunk_id), in retrieval order"""
+    return tuple((doc.metadata.get("source"), doc.metadata.get("chunk_id")) for doc in docs)
 
-def build_persistent_chroma(chunks: List[Document], persist_directory: str = "finance_chroma_db", force_rebuild: bool = False) -> Chroma:
+
+class SemanticAnswerCache:
+    """
+    Remembers recent answers and reuses them for near-identical questions
+    
+    An answer is only reused when the new question also retrieved exactly
+    the same chunks, since generation depends on the context as much as on
+    the wording. Query embeddings are L2-normalized, so a dot product
+    against the stored vectors gives cosine similarity.
+    """
+    
+    def __init__(self, max_entries: int = 100, threshold: float = 0.97):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._vectors: Optional[np.ndarray] = None
+        self._chunk_ids: List[tuple] = []
+        self._results: List[Dict] = []
+    
+    def lookup(self, query_vector: List[float], docs: List[Document]) -> Optional[Dict]:
+        """Return the cached result for the most similar question over the same chunks, if above the threshold"""
+        if self._vectors is None:
+            return None
+        scores = self._vectors @ np.asarray(query_vector, dtype=np.float32)
+        chunk_ids = _chunk_ids(docs)
+        scores[np.array([ids != chunk_ids for ids in self._chunk_ids], dtype=bool)] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] >= self.threshold:
+            return self._results[best]
+        return None
+    
+    def add(self, query_vector: List[float], result: Dict) -> None:
+        """Store a result, evicting the oldest entry once full"""
+        vector = np.asarray(query_vector, dtype=np.float32)[None, :]
+        if self._vectors is None:
+            self._vectors = vector
+        else:
+            self._vectors = np.vstack([self._vectors, vector])[-self.max_entries:]
+        self._chunk_ids = (self._chunk_ids + [_chunk_ids(result["source_documents"])])[-self.max_entries:]
+        self._results = (self._results + [result])[-self.max_entries:]
+
+
+def build_persistent_chroma(chunks: Iterable[Document], persist_directory: str = "finance_chroma_db", force_rebuild: bool = False, batch_size: int = 1024) -> Optional[Chroma]:
     """
     Build or load a persistent Chroma vector database
     
+    Chunks are only consumed when building, so passing a lazy iterator
+    skips PDF loading entirely when the database already exists.
+    
     Args:
-        chunks: List of document chunks
+        chunks: Iterable of document chunks
         persist_directory: Directory to persist the database
         force_rebuild: If True, rebuild database even if it exists
+        batch_size: Number of chunks embedded and inserted per batch
         
     Returns:
-        Chroma vector store instance
+        Chroma vector store instance, or None if there was nothing to index
     """
     print(f"🗄️  Building persistent Chroma DB at: {persist_directory}")
     
-    # Initialize embeddings model
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
-    )
+    # Any database whose build wasn't interrupted is loaded; an interrupted one is rebuilt
+    db_file = Path(persist_directory) / "chroma.sqlite3"
+    complete_file = Path(persist_directory) / _BUILD_COMPLETE_FILE
+    in_progress_file = Path(persist_directory) / _BUILD_IN_PROGRESS_FILE
+    interrupted = in_progress_file.exists()
     
-    # Check if database already exists
-    if os.path.exists(persist_directory) and not force_rebuild:
+    if db_file.exists() and not interrupted and not force_rebuild:
         print(f"  ℹ️  Found existing database, loading...")
+        # Databases from older versions have no marker; they still work, just with other chunks
+        if not complete_file.exists() or complete_file.read_text() != _CHUNKING_SIGNATURE:
+            print(f"  ⚠ Database was built with different chunking settings; "
+                  f"set force_rebuild = True to rebuild it with the current ones")
+        # Loading never embeds documents; the model is loaded on the first query
         vectorstore = Chroma(
             persist_directory=persist_directory,
-            embedding_function=embeddings
+            embedding_function=LazyEmbeddings(load_embeddings)
         )
         print(f"  ✓ Loaded existing database with {vectorstore._collection.count()} documents")
     else:
-        if force_rebuild and os.path.exists(persist_directory):
-            print(f"  ℹ️  Force rebuild requested, recreating database...")
+        # Never delete a directory we don't recognise unless explicitly asked to
+        if not (force_rebuild or interrupted) and os.path.isdir(persist_directory) and os.listdir(persist_directory):
+            raise FileExistsError(
+                f"{persist_directory} exists but does not contain a Chroma DB; "
+                f"set force_rebuild = True to replace it or choose another persist_dir"
+            )
+        
+        # Pull the first chunk before touching the directory so an empty
+        # folder never replaces an existing database
+        chunks = iter(chunks)
+        first = next(chunks, None)
+        if first is None:
+            return None
+        chunks = chain([first], chunks)
+        
+        if (force_rebuild or interrupted) and os.path.exists(persist_directory):
+            if force_rebuild:
+                print(f"  ℹ️  Force rebuild requested, recreating database...")
+            else:
+                print(f"  ⚠ Previous build was interrupted, recreating database...")
             import shutil
             shutil.rmtree(persist_directory)
         else:
             print(f"  ℹ️  Creating new database...")
-            
-        vectorstore = Chroma.from_documents(
-            documents=chunks,
-            embedding=embeddings,
-            persist_directory=persist_directory
+        
+        Path(persist_directory).mkdir(parents=True, exist_ok=True)
+        in_progress_file.touch()
+        
+        # Unchanged chunks reuse cached vectors; the model only loads if something is new
+        embeddings = CachedEmbeddings(LazyEmbeddings(load_embeddings))
+        vectorstore = Chroma(
+            persist_directory=persist_directory,
+            embedding_function=embeddings
         )
-        print(f"  ✓ Created database with {len(chunks)} documents")
+        
+        # Embed and insert precomputed vectors batch by batch, so only one
+        # batch of chunks is held in memory. Duplicate chunks are still
+        # stored so every source keeps its metadata.
+        count = 0
+        matrix = []
+        for batch in _batched(chunks, batch_size):
+            texts = [chunk.page_content for chunk in batch]
+            vectors = embeddings.embed_documents(texts)
+            vectorstore._collection.add(
+                ids=[f"c{i}" for i in range(count, count + len(batch))],
+                embeddings=vectors,
+                documents=texts,
+                metadatas=[chunk.metadata for chunk in batch]
+            )
+            matrix.append(np.asarray(vectors, dtype=np.float32))
+            count += len(batch)
+        
+        # Contiguous copy of every vector for MatmulRetriever
+        np.save(Path(persist_directory) / _EMBEDDING_MATRIX_FILE, np.vstack(matrix))
+        
+        # Mark the build complete only after every chunk and the matrix are on disk
+        complete_file.write_text(_CHUNKING_SIGNATURE)
+        in_progress_file.unlink()
+        print(f"  ℹ️  Embedded {embeddings.misses} new chunks ({embeddings.hits} from cache)")
+        print(f"  ✓ Created database with {count} documents")
     
     print(f"✅ Chroma DB ready\n")
     return vectorstore
 
 
-def build_rag(vectorstore: Chroma) -> RetrievalQA:
+def _new_faiss_index(dim: int, num_vectors: int, quantize: bool = True):
+    """
+    Create an inner-product FAISS index sized for the corpus
+    
+    Args:
+        dim: Embedding dimension
+        num_vectors: Number of vectors that will be indexed
+        quantize: Store vectors as int8 (4x smaller) instead of float32
+        
+    Returns:
+        Flat index for small corpora, HNSW graph index above 100K vectors
+    """
+    import faiss
+    
+    if num_vectors <= 100_000:
+        if quantize:
+            return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexFlatIP(dim)
+    
+    if quantize:
+        index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, 32, faiss.METRIC_INNER_PRODUCT)
+    else:
+        index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = 200
+    return index
+
+
+def build_persistent_faiss(chunks: Iterable[Document], persist_directory: str = "finance_faiss_index", force_rebuild: bool = False, quantize: bool = True, batch_size: int = 1024) -> Optional[FAISS]:
+    """
+    Build or load a persistent FAISS vector index
+    
+    Embeddings are L2-normalized, so inner product equals cosine similarity.
+    Chunks are only consumed when building.
+    
+    Args:
+        chunks: Iterable of document chunks
+        persist_directory: Directory to persist the index
+        force_rebuild: If True, rebuild index even if it exists
+        quantize: If True, store vectors as int8 with a scalar quantizer
+        batch_size: Number of chunks embedded per batch
+        
+    Returns:
+        FAISS vector store instance, or None if there was nothing to index
+    """
+    print(f"🗄️  Building persistent FAISS index at: {persist_directory}")
+    
+    # Check if index already exists
+    if (Path(persist_directory) / "index.faiss").exists() and not force_rebuild:
+        print(f"  ℹ️  Found existing index, loading...")
+        vectorstore = FAISS.load_local(
+            persist_directory,
+            LazyEmbeddings(load_embeddings),
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+        print(f"  ✓ Loaded existing index with {vectorstore.index.ntotal} documents")
+    else:
+        if force_rebuild and os.path.exists(persist_directory):
+            print(f"  ℹ️  Force rebuild requested, recreating index...")
+        else:
+            print(f"  ℹ️  Creating new index...")
+        
+        # Unchanged chunks reuse cached vectors; the model only loads if something is new.
+        # FAISS keeps texts in memory anyway, so only the PDF text is streamed.
+        embeddings = CachedEmbeddings(LazyEmbeddings(load_embeddings))
+        texts, metadatas, vectors = [], [], []
+        for batch in _batched(chunks, batch_size):
+            batch_texts = [chunk.page_content for chunk in batch]
+            texts.extend(batch_texts)
+            metadatas.extend(chunk.metadata for chunk in batch)
+            vectors.extend(embeddings.embed_documents(batch_texts))
+        
+        if not texts:
+            return None
+        print(f"  ℹ️  Embedded {embeddings.misses} new chunks ({embeddings.hits} from cache)")
+        
+        index = _new_faiss_index(len(vectors[0]), len(vectors), quantize)
+        if not index.is_trained:
+            # The scalar quantizer learns per-dimension value ranges from the data
+            index.train(np.asarray(vectors, dtype=np.float32))
+        
+        vectorstore = FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+        vectorstore.add_embeddings(
+            text_embeddings=list(zip(texts, vectors)),
+            metadatas=metadatas
+        )
+        vectorstore.save_local(persist_directory)
+        print(f"  ✓ Created index with {len(texts)} documents")
+    
+    print(f"✅ FAISS index ready\n")
+    return vectorstore
+
+
+def load_llm_pipeline():
+    """
+    Load the FLAN-T5 text2text-generation pipeline on the fastest available runtime
+    
+    Uses PyTorch on CUDA, and an ONNX Runtime export with KV-cache on CPU.
+    
+    Returns:
+        HuggingFace pipeline
+    """
+    # Greedy decoding: grounded answers don't benefit from sampling, and
+    # deterministic output makes answers safe to cache
+    generation_kwargs = dict(
+        max_new_tokens=256,  # Budget for the answer only; long prompts no longer eat into it
+        do_sample=False,
+        num_beams=1
+    )
+    
+    if torch.cuda.is_available():
+        return pipeline("text2text-generation", model=LLM_MODEL, device=0, **generation_kwargs)
+    
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from transformers import AutoTokenizer
+    
+    torch.set_num_threads(os.cpu_count() or 1)
+    
+    # use_cache=True exports the decoder-with-past graph so decoding reuses the KV cache
+    model_dir = _ONNX_MODEL_DIR / LLM_MODEL.split("/")[-1]
+    if model_dir.exists():
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_dir, use_cache=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    else:
+        print(f"  ℹ️  Exporting {LLM_MODEL} to ONNX (first run only)...")
+        model = ORTModelForSeq2SeqLM.from_pretrained(LLM_MODEL, export=True, use_cache=True)
+        tokenizer = AutoTokenizer.from_pretrained(LLM_MODEL)
+        model.save_pretrained(model_dir)
+        tokenizer.save_pretrained(model_dir)
+    
+    return pipeline("text2text-generation", model=model, tokenizer=tokenizer, **generation_kwargs)
+
+
+class MatmulRetriever(BaseRetriever):
+    """
+    Exact top-k retriever over a Chroma collection using one matrix-vector product
+    
+    For small and medium corpora a BLAS GEMV over all normalized embeddings
+    is faster than walking the HNSW graph, and it is exact.
+    """
+    
+    vectorstore: Chroma
+    matrix: np.ndarray
+    k: int = 5
+    
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        query_vector = np.asarray(self.vectorstore.embeddings.embed_query(query), dtype=np.float32)
+        scores = self.matrix @ query_vector
+        
+        k = min(self.k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        ids = [f"c{i}" for i in top]
+        found = self.vectorstore._collection.get(ids=ids, include=["documents", "metadatas"])
+        by_id = {
+            id_: Document(page_content=text, metadata=metadata)
+            for id_, text, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+        return [by_id[id_] for id_ in ids if id_ in by_id]
+
+
+def build_retriever(vectorstore: VectorStore, persist_directory: Optional[str] = None, k: int = 5) -> BaseRetriever:
+    """
+    Pick the fastest retriever for the vector store
+    
+    Uses MatmulRetriever when a Chroma DB has a matching embedding matrix
+    and at most MATMUL_MAX_VECTORS chunks, otherwise the store's own search.
+    
+    Args:
+        vectorstore: Chroma or FAISS vector store
+        persist_directory: Chroma directory holding the embedding matrix
+        k: Number of chunks to retrieve
+        
+    Returns:
+        LangChain retriever
+    """
+    if isinstance(vectorstore, Chroma) and persist_directory:
+        matrix_file = Path(persist_directory) / _EMBEDDING_MATRIX_FILE
+        if matrix_file.exists():
+            matrix = np.load(matrix_file, mmap_mode="r")
+            # Databases built before the matrix existed use different ids
+            if len(matrix) <= MATMUL_MAX_VECTORS and len(matrix) == vectorstore._collection.count():
+                return MatmulRetriever(vectorstore=vectorstore, matrix=matrix, k=k)
+    
+    return vectorstore.as_retriever(
+        search_type="similarity",
+        search_kwargs={"k": k}
+    )
+
+
+def build_rag(vectorstore: VectorStore, persist_directory: Optional[str] = None, retriever: Optional[BaseRetriever] = None) -> RetrievalQA:
     """
     Build RAG chain with retriever and LLM
     
     Args:
-        vectorstore: Chroma vector store
+        vectorstore: Chroma or FAISS vector store
+        persist_directory: Chroma directory, used to find the embedding matrix
+        retriever: Retriever to use instead of building one from the store
         
     Returns:
         RetrievalQA chain
@@ -170,23 +751,16 @@ def build_rag(vectorstore: Chroma) -> RetrievalQA:
     print("🤖 Building RAG chain...")
     
     # Create retriever with better search parameters
-    retriever = vectorstore.as_retriever(
-        search_type="similarity",
-        search_kwargs={"k": 5}  # Retrieve top 5 most relevant chunks
-    )
+    if retriever is None:
+        retriever = build_retriever(
+            vectorstore,
+            persist_directory,
+            k=5  # Retrieve top 5 most relevant chunks
+        )
     
     # Load local LLM with better parameters
     print("  ℹ️  Loading language model...")
-    hf_pipeline = pipeline(
-        "text2text-generation",
-        model="google/flan-t5-base",  # Using larger base model for better accuracy
-        max_length=512,
-        temperature=0.3,  # Lower temperature for more focused answers
-        do_sample=True,
-        top_p=0.95
-    )
-    
-    llm = HuggingFacePipeline(pipeline=hf_pipeline)
+    llm = HuggingFacePipeline(pipeline=load_llm_pipeline())
     
     # Create custom prompt template for better answers
     prompt_template = """Use the following pieces of context to answer the question at the end. 
@@ -218,6 +792,52 @@ Detailed Answer:"""
     return qa_chain
 
 
+def search_question(retriever: BaseRetriever, embeddings: Embeddings, query: str) -> Tuple[List[float], List[Document]]:
+    """
+    Embed a question and retrieve its context (runs on a background thread)
+    
+    On the first question this also loads the embedding model, so it
+    overlaps with loading the LLM on the main thread.
+    
+    Args:
+        retriever: Retriever from build_retriever
+        embeddings: The vector store's (query-caching) embeddings
+        query: User question
+        
+    Returns:
+        Tuple of (query embedding, retrieved chunks)
+    """
+    query_vector = embeddings.embed_query(query)
+    # The retriever embeds the query again, which hits the LRU cache
+    docs = retriever.get_relevant_documents(query)
+    return query_vector, docs
+
+
+def answer_question(qa_chain: RetrievalQA, query: str, docs: Optional[List[Document]] = None) -> Dict:
+    """
+    Retrieve context for a question and generate an answer
+    
+    Decoding is greedy, so the same question over the same retrieved chunks
+    always produces the same answer; SemanticAnswerCache relies on this.
+    
+    Args:
+        qa_chain: RetrievalQA chain from build_rag
+        query: User question
+        docs: Already-retrieved chunks; retrieved with the chain's retriever if omitted
+        
+    Returns:
+        Dictionary with 'query', 'result' and 'source_documents' keys
+    """
+    if docs is None:
+        docs = qa_chain.retriever.get_relevant_documents(query)
+    answer = qa_chain.combine_documents_chain.run(input_documents=docs, question=query)
+    return {
+        "query": query,
+        "result": answer,
+        "source_documents": docs
+    }
+
+
 def main():
     """Main execution function"""
     print("=" * 60)
@@ -228,23 +848,38 @@ def main():
     # Configuration - UPDATE THIS PATH TO YOUR PDF FOLDER
     pdf_folder = "finance_pdfs"  # Path to folder containing PDF files (relative or absolute)
     persist_dir = "finance_chroma_db"  # Database storage location
+    vector_backend = "chroma"  # "chroma" (persistent DB) or "faiss" (exact inner-product index)
+    faiss_dir = "finance_faiss_index"  # Index storage location when using FAISS
     force_rebuild = False  # Set to True to rebuild database with new chunking strategy
+    workers = None  # Processes used for PDF extraction and chunking (None = all CPU cores)
+    pdf_backend = "pdfium"  # "pdfium" for fast text extraction, "fitz" to use PyMuPDF
+    io_workers = 0  # Threads prefetching PDF bytes; set to ~8 when PDFs live on a network drive
     
-    # Load PDFs
-    documents = load_financial_pdfs(pdf_folder)
+    # Load and chunk PDFs lazily; nothing is read unless the database has to be built
+    chunks = iter_pdf_chunks(pdf_folder, workers=workers, backend=pdf_backend, io_workers=io_workers)
     
-    if not documents:
-        print("❌ No documents loaded. Please add PDF files to the 'finance_pdfs' folder.")
+    # Build persistent vector database
+    try:
+        if vector_backend == "faiss":
+            vectorstore = build_persistent_faiss(chunks, faiss_dir, force_rebuild)
+        else:
+            vectorstore = build_persistent_chroma(chunks, persist_dir, force_rebuild)
+    except FileExistsError as e:
+        print(f"❌ {e}")
         sys.exit(1)
     
-    # Chunk documents
-    chunks = chunk_documents(documents)
+    if vectorstore is None:
+        print("❌ No documents loaded. Please add PDF files to the 'finance_pdfs' folder.")
+        sys.exit(1)
     
-    # Build persistent vector database
-    vectorstore = build_persistent_chroma(chunks, persist_dir, force_rebuild)
+    # RAG chain (and its LLM) is built on the first question
+    qa_chain = None
+    answer_cache = SemanticAnswerCache()
     
-    # Build RAG chain
-    qa_chain = build_rag(vectorstore)
+    # Query embedding and retrieval run on a background thread, so on the first
+    # question they overlap with loading the LLM
+    retriever = build_retriever(vectorstore, persist_dir if vector_backend == "chroma" else None, k=5)
+    search_executor = ThreadPoolExecutor(max_workers=1)
     
     # Interactive query loop
     print("=" * 60)
@@ -263,9 +898,25 @@ def main():
                 print("\n👋 Goodbye!")
                 break
             
-            print("\n🔍 Searching and generating answer...\n")
+            # Start embedding and searching right away
+            search_future = search_executor.submit(search_question, retriever, vectorstore.embeddings, query)
             
-            result = qa_chain({"query": query})
+            # The answer cache is empty until the first answer, so the LLM is always needed then
+            if qa_chain is None:
+                print()
+                qa_chain = build_rag(vectorstore, retriever=retriever)
+            
+            # Near-duplicate questions over the same chunks are answered from the session cache
+            query_vector, docs = search_future.result()
+            result = answer_cache.lookup(query_vector, docs)
+            
+            if result is not None:
+                print("\n♻️  Reusing the answer to a similar earlier question...\n")
+            else:
+                print("\n🔍 Searching and generating answer...\n")
+                
+                result = answer_question(qa_chain, query, docs)
+                answer_cache.add(query_vector, result)
             
             print(f"💡 Answer: {result['result']}\n")
             
@@ -292,6 +943,8 @@ def main():
             break
         except Exception as e:
             print(f"\n❌ Error: {e}\n")
+    
+    search_executor.shutdown(wait=False)
 
 
 if __name__ == "__main__":